@@ -1,34 +1,40 @@
 # app.py
 from __future__ import annotations
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import io
+import uuid
 
 import pandas as pd
 import streamlit as st
 
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, NamedStyle
+from openpyxl.utils import get_column_letter
 
-from qf3_api import QF3Client, QF3Config
+from qf3_api import MAX_CONCURRENCY, QF3Client, QF3Config
 
 
 st.set_page_config(page_title="공정검사 이력조회", layout="wide")
 
+# 엑셀 생성 시 미리 요청해 둘 검사결과(line_list) 최대 건수
+LINE_PREFETCH = MAX_CONCURRENCY * 2
+
 
 def _to_date_str(d: date) -> str:
     return d.strftime("%Y-%m-%d")
 
 
 def _df_from_rows(rows: List[Dict[str, Any]], cols: Optional[List[str]] = None) -> pd.DataFrame:
-    df = pd.DataFrame(rows or [])
+    # cols를 생성 시점에 넘겨서 필요한 컬럼만 한 번에 만든다 (없는 키는 빈 값)
     if cols:
-        for c in cols:
-            if c not in df.columns:
-                df[c] = None
-        df = df[cols]
-    return df
+        return pd.DataFrame.from_records(rows or [], columns=cols)
+    return pd.DataFrame(rows or [])
 
 
 def _workcenter_from_head(h: dict) -> str:
@@ -63,20 +69,117 @@ def _filter_heads_by_item_name(heads: list, item_name_q: str) -> list:
     if not tokens:
         return heads
 
+    # 토큰은 한 번만, 품목명은 행당 한 번만 소문자로 변환 (첫 불일치 토큰에서 중단)
+    toks = [t.lower() for t in tokens]
     out = []
     for h in heads:
-        name = (h.get("itemName") or "")
-        name_l = name.lower()
-        ok = True
-        for t in tokens:
-            if t.lower() not in name_l:
-                ok = False
+        name_l = (h.get("itemName") or "").lower()
+        for t in toks:
+            if t not in name_l:
                 break
-        if ok:
+        else:
             out.append(h)
     return out
 
 
+# [조회] 직후 엑셀 다운로드 시 같은 서버 페이지 요청을 반복하지 않도록 캐시 (최대 5분)
+#   - _client 인자는 밑줄로 시작하므로 캐시 키(해시)에서 제외된다.
+#   - 캐시는 프로세스 전체에서 공유되므로 로그인 계정(company_code, user_key)을 키에 포함
+#   - query_token은 [조회]를 누를 때마다 새로 만드는 프로세스 전체에서 유일한 값(uuid)
+#     → 다른 세션과 키가 겹치지 않고, 조회는 항상 서버에서 새로 가져온다
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def _cached_job_mp(
+    company_code: str,
+    user_key: str,
+    query_token: str,
+    released_date_from: str,
+    released_date_to: str,
+    _client: QF3Client,
+) -> Dict[str, Dict[str, Any]]:
+    return _client.build_job_equipment_map(
+        released_date_from=released_date_from,
+        released_date_to=released_date_to,
+    )
+
+
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def _cached_all_heads(
+    company_code: str,
+    user_key: str,
+    query_token: str,
+    inspection_date_from: str,
+    inspection_date_to: str,
+    item_code: str,
+    job_name: str,
+    operation_code: str,
+    _client: QF3Client,
+) -> List[Dict[str, Any]]:
+    return _client.fetch_all_heads(
+        inspection_date_from=inspection_date_from,
+        inspection_date_to=inspection_date_to,
+        item_code=item_code,
+        item_name="",
+        job_name=job_name,
+        operation_code=operation_code,
+        person_id=0,
+        check_class="OPR",
+        limit=500,
+    )
+
+
+# 같은 계정은 세션/재실행 간에 클라이언트(연결 풀, 쿠키)를 공유.
+# 로그인 자체는 버튼을 누를 때마다 다시 수행하므로 서버 세션이 만료돼도 재로그인으로 복구된다.
+# (QF3Client.login은 임시 클라이언트로 로그인하고 성공 시에만 쿠키를 반영 → 실패한 시도가
+#  같은 계정의 다른 세션에 영향을 주지 않음)
+# (TTL 없음: 계정당 하나만 유지되고 만료로 버려지는 미종료 클라이언트가 생기지 않음)
+@st.cache_resource(show_spinner=False)
+def _get_client(company_code: str, user_key: str) -> QF3Client:
+    cfg = QF3Config(company_id=100, plant_id=11, language_code="KO")
+    return QF3Client(cfg)
+
+
+def _iter_line_lists(heads2: list, client: QF3Client, prefetch: int = LINE_PREFETCH) -> Iterator[Tuple[dict, Dict[str, Any]]]:
+    """
+    heads2 순서대로 (head, line_list 응답)을 돌려준다.
+      - 최대 prefetch건까지 스레드풀로 미리 요청 → 엑셀 기록 중에도 네트워크 대기가 진행됨
+      - 한 건을 꺼낼 때마다 다음 한 건을 요청 → 메모리에 쌓이는 응답 수는 prefetch로 제한
+        (store_cache=False로 요청하므로 client의 line_list 캐시에도 쌓이지 않음)
+      - 대기 중인 같은 mfgInspectionId는 요청 하나를 공유
+    """
+    it = iter(heads2)
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as ex:
+        pending: deque = deque()
+        inflight: Dict[int, Any] = {}   # mfgInspectionId -> future
+        refs: Dict[int, int] = {}       # pending 안에서 해당 id를 기다리는 건수
+
+        def _submit(h):
+            mid = int(h["mfgInspectionId"])
+            fut = inflight.get(mid)
+            if fut is None:
+                fut = inflight[mid] = ex.submit(
+                    client.line_list, mfg_inspection_id=mid, page=1, limit=500, node="root", store_cache=False
+                )
+            refs[mid] = refs.get(mid, 0) + 1
+            pending.append((h, mid, fut))
+
+        for h in islice(it, prefetch):
+            _submit(h)
+        try:
+            while pending:
+                h, mid, fut = pending.popleft()
+                refs[mid] -= 1
+                if not refs[mid]:
+                    del refs[mid]
+                    del inflight[mid]
+                for nxt in islice(it, 1):
+                    _submit(nxt)
+                yield h, fut.result()
+        finally:
+            # 중간에 실패/중단되면 아직 시작 안 한 요청은 취소
+            for _, _, fut in pending:
+                fut.cancel()
+
+
 def _excel_one_sheet_item_then_results(heads2: list, client: QF3Client, progress_cb=None) -> bytes:
     """
     한 시트 구조:
@@ -85,85 +188,96 @@ def _excel_one_sheet_item_then_results(heads2: list, client: QF3Client, progress
       - 다음 품목 반복
     ※ 요청 반영: 품목 사이 '완전 빈 행'은 넣지 않음
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "품목_검사결과"
+    # 대용량 대비: write-only 모드로 행을 스트리밍 기록 (셀 객체를 메모리에 쌓지 않음)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("품목_검사결과")
 
     columns = [
         "구분", "품목코드", "품목명", "작업장",
         "검사항목", "측정값", "단위", "기준", "상한", "하한", "판정"
     ]
-    ws.append(columns)
-
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill("solid", fgColor="1F4E79")
-    header_align = Alignment(horizontal="center", vertical="center")
-    for col_idx in range(1, len(columns) + 1):
-        c = ws.cell(row=1, column=col_idx)
-        c.font = header_font
-        c.fill = header_fill
-        c.alignment = header_align
-
-    item_fill = PatternFill("solid", fgColor="2F2F2F")
-    item_font = Font(bold=True, color="FFFFFF")
-    item_align = Alignment(horizontal="left", vertical="center")
-
-    row_num = 2
-    total = len(heads2)
-
-    for i, h in enumerate(heads2, start=1):
-        wc = _workcenter_from_head(h)
-        item_code = h.get("itemCode")
-        item_name = h.get("itemName")
-        mid = int(h["mfgInspectionId"])
-
-        # 품목행
-        ws.append(["품목", item_code, item_name, wc, "", "", "", "", "", "", ""])
-        for col_idx in range(1, len(columns) + 1):
-            c = ws.cell(row=row_num, column=col_idx)
-            c.fill = item_fill
-            c.font = item_font
-            c.alignment = item_align
-        row_num += 1
-
-        # 검사결과 (바로 아래)
-        resp_l = client.line_list(mfg_inspection_id=mid, page=1, limit=500, node="root")
-        rows_l = client._extract_list(resp_l)
-
-        if not rows_l:
-            ws.append(["검사", item_code, item_name, wc, "(검사결과 없음)", "", "", "", "", "", ""])
-            row_num += 1
-        else:
-            for r in rows_l:
-                ws.append([
-                    "검사",
-                    item_code,
-                    item_name,
-                    wc,
-                    r.get("level3ClassName"),
-                    r.get("checkValue"),
-                    r.get("unit"),
-                    r.get("standardValue"),
-                    r.get("upperLimit"),
-                    r.get("lowerLimit"),
-                    r.get("passDecision"),
-                ])
-                row_num += 1
-
-        # ✅ 요청 반영: 품목 단위로 넣던 '완전 빈 줄' 제거
-        # ws.append(["", "", "", "", "", "", "", "", "", "", ""])
-        # row_num += 1
-
-        if progress_cb:
-            progress_cb(i, total)
-
-    # 열 너비
+
+    # 헤더/품목행 스타일은 NamedStyle로 한 번만 등록하고 셀에는 이름만 지정
+    header_style = NamedStyle(name="header_style")
+    header_style.font = Font(bold=True, color="FFFFFF")
+    header_style.fill = PatternFill("solid", fgColor="1F4E79")
+    header_style.alignment = Alignment(horizontal="center", vertical="center")
+    wb.add_named_style(header_style)
+
+    item_style = NamedStyle(name="item_style")
+    item_style.fill = PatternFill("solid", fgColor="2F2F2F")
+    item_style.font = Font(bold=True, color="FFFFFF")
+    item_style.alignment = Alignment(horizontal="left", vertical="center")
+    wb.add_named_style(item_style)
+
+    def _styled_row(values, style_name):
+        cells = []
+        for v in values:
+            c = WriteOnlyCell(ws, value=v)
+            c.style = style_name
+            cells.append(c)
+        return cells
+
+    # 열 너비 / 틀 고정 (write-only 모드는 첫 append 전에 지정해야 함)
     widths = [7, 14, 28, 14, 22, 10, 8, 10, 10, 10, 8]
     for i, w in enumerate(widths, start=1):
-        ws.column_dimensions[chr(64 + i)].width = w
+        ws.column_dimensions[get_column_letter(i)].width = w
 
     ws.freeze_panes = "A2"
 
+    # write-only 시트는 임시파일(openpyxl.*)에 기록되므로, 저장 전에 실패하면 직접 정리
+    try:
+        ws.append(_styled_row(columns, "header_style"))
+
+        total = len(heads2)
+
+        # 검사결과는 병렬로 미리 요청(최대 LINE_PREFETCH건)하고, 기록은 heads2 순서대로
+        for i, (h, resp_l) in enumerate(_iter_line_lists(heads2, client), start=1):
+            wc = _workcenter_from_head(h)
+            item_code = h.get("itemCode")
+            item_name = h.get("itemName")
+
+            # 품목행
+            ws.append(_styled_row(
+                ["품목", item_code, item_name, wc, "", "", "", "", "", "", ""],
+                "item_style",
+            ))
+
+            # 검사결과 (바로 아래)
+            rows_l = client._extract_list(resp_l)
+
+            if not rows_l:
+                ws.append(["검사", item_code, item_name, wc, "(검사결과 없음)", "", "", "", "", "", ""])
+            else:
+                for r in rows_l:
+                    ws.append([
+                        "검사",
+                        item_code,
+                        item_name,
+                        wc,
+                        r.get("level3ClassName"),
+                        r.get("checkValue"),
+                        r.get("unit"),
+                        r.get("standardValue"),
+                        r.get("upperLimit"),
+                        r.get("lowerLimit"),
+                        r.get("passDecision"),
+                    ])
+
+            # ✅ 요청 반영: 품목 단위로 넣던 '완전 빈 줄' 제거
+            # ws.append(["", "", "", "", "", "", "", "", "", "", ""])
+
+            if progress_cb:
+                progress_cb(i, total)
+    except BaseException:
+        writer = ws._writer
+        if writer is not None:
+            try:
+                ws.close()
+            finally:
+                writer.cleanup()
+        raise
+
     buf = io.BytesIO()
     wb.save(buf)
     return buf.getvalue()
@@ -173,6 +287,8 @@ def init_state():
     ss = st.session_state
     ss.setdefault("logged_in", False)
     ss.setdefault("client", None)
+    ss.setdefault("login_id", ("", ""))
+    ss.setdefault("query_token", uuid.uuid4().hex)
 
     ss.setdefault("head_df", pd.DataFrame())
     ss.setdefault("head_rows", [])
@@ -202,11 +318,11 @@ with st.expander("로그인", expanded=not st.session_state.logged_in):
                 if not company_code or not user_key or not password:
                     raise RuntimeError("회사코드/아이디/비밀번호를 입력하세요.")
 
-                cfg = QF3Config(company_id=100, plant_id=11, language_code="KO")
-                client = QF3Client(cfg)
+                client = _get_client(company_code, user_key)
                 client.login(company_code=company_code, user_key=user_key, password=password)
 
                 st.session_state.client = client
+                st.session_state.login_id = (company_code, user_key)
                 st.session_state.logged_in = True
                 st.success("로그인 성공")
             except Exception as e:
@@ -218,6 +334,7 @@ if not st.session_state.logged_in:
     st.stop()
 
 client: QF3Client = st.session_state.client
+login_company_code, login_user_key = st.session_state.login_id
 
 # ---------------- Filters ----------------
 st.subheader("조회")
@@ -266,22 +383,25 @@ released_to = _to_date_str(d_to + timedelta(days=7))
 
 if do_query:
     try:
-        job_mp = client.build_job_equipment_map(released_date_from=released_from, released_date_to=released_to)
+        # 조회할 때마다 검사결과(line_list) 캐시를 비우고 query_token을 새로 만들어
+        # head/작업지시도 서버에서 새로 가져온다
+        client.clear_cache()
+        st.session_state.query_token = uuid.uuid4().hex
+        query_token = st.session_state.query_token
+
+        job_mp = _cached_job_mp(
+            login_company_code, login_user_key, query_token,
+            released_from, released_to, client,
+        )
 
         # API에 item_name 파라미터가 확실치 않아서,
         # 1) 서버 조회는 기존처럼 가져오고
         # 2) 품목명은 로컬에서 AND 필터 적용
         if fetch_all:
-            heads = client.fetch_all_heads(
-                inspection_date_from=inspection_date_from,
-                inspection_date_to=inspection_date_to,
-                item_code=item_code,
-                item_name="",
-                job_name=job_name,
-                operation_code=operation_code,
-                person_id=0,
-                check_class="OPR",
-                limit=500,
+            heads = _cached_all_heads(
+                login_company_code, login_user_key, query_token,
+                inspection_date_from, inspection_date_to,
+                item_code, job_name, operation_code, client,
             )
         else:
             resp = client.head_list(
@@ -380,19 +500,19 @@ st.markdown("### 엑셀 다운로드 (한 시트 / 전체)")
 
 if st.button("엑셀 다운로드(조회조건 전체)", use_container_width=True):
     try:
-        # ✅ 엑셀은 항상 서버에서 '전체' 다시 긁어서 만든다
-        job_mp = client.build_job_equipment_map(released_date_from=released_from, released_date_to=released_to)
-
-        heads = client.fetch_all_heads(
-            inspection_date_from=inspection_date_from,
-            inspection_date_to=inspection_date_to,
-            item_code=item_code,
-            item_name="",
-            job_name=job_name,
-            operation_code=operation_code,
-            person_id=0,
-            check_class="OPR",
-            limit=500,
+        # ✅ 엑셀은 항상 '전체' 기준으로 만든다.
+        # 단, 마지막 [조회]와 조건이 같으면 그때 서버에서 가져온 결과(최대 5분 전)를 재사용하고,
+        # 조건이 다르거나 5분이 지났으면 서버에서 다시 가져온다.
+        query_token = st.session_state.query_token
+        job_mp = _cached_job_mp(
+            login_company_code, login_user_key, query_token,
+            released_from, released_to, client,
+        )
+
+        heads = _cached_all_heads(
+            login_company_code, login_user_key, query_token,
+            inspection_date_from, inspection_date_to,
+            item_code, job_name, operation_code, client,
         )
         heads2 = client.attach_equipment_to_heads(heads, job_mp)
 
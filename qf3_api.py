@@ -1,9 +1,23 @@
 # qf3_api.py
 from __future__ import annotations
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Any, Dict, List
-import requests
+from typing import Any, Callable, Dict, List, Tuple
+import threading
+import time
+
+import httpx
+import orjson
+
+
+# 서버 부하를 고려한 동시 요청 상한
+MAX_CONCURRENCY = 8
+
+# line_list 응답 캐시 최대 개수 (LRU) / 유효시간(초)
+LINE_CACHE_SIZE = 1024
+LINE_CACHE_TTL = 300
 
 
 @dataclass
@@ -17,14 +31,28 @@ class QF3Config:
 class QF3Client:
     def __init__(self, config: QF3Config):
         self.config = config
-        self.sess = requests.Session()
-        self.sess.headers.update({
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-            "X-Requested-With": "XMLHttpRequest",
-            "Origin": "https://qf3.qfactory.biz",
-            "Referer": "https://qf3.qfactory.biz/",
-        })
+        # HTTP/2: 병렬 요청(페이지/검사결과)이 하나의 TLS 연결을 다중화해서 공유
+        # (HTTP/1.1로 협상되면 연결 풀 크기가 동시 요청 수를 받쳐준다)
+        self.sess = httpx.Client(
+            http2=True,
+            timeout=30,
+            follow_redirects=True,  # requests.Session과 동일하게 리다이렉트 추종
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=10),
+            headers={
+                "Accept": "*/*",
+                "Content-Type": "application/json",
+                "X-Requested-With": "XMLHttpRequest",
+                "Origin": "https://qf3.qfactory.biz",
+                "Referer": "https://qf3.qfactory.biz/",
+            },
+        )
+        # key -> (저장 시각, 응답 원문 bytes)
+        self._line_cache: "OrderedDict[Tuple[int, int, int, str], Tuple[float, bytes]]" = OrderedDict()
+        self._line_cache_lock = threading.Lock()
+
+    def clear_cache(self) -> None:
+        with self._line_cache_lock:
+            self._line_cache.clear()
 
     # ---------- Auth ----------
     def login(self, company_code: str, user_key: str, password: str) -> Dict[str, Any]:
@@ -35,11 +63,21 @@ class QF3Client:
             "password": password,
             "languageCode": self.config.language_code,
         }
-        r = self.sess.post(url, json=payload, timeout=30)
-        r.raise_for_status()
-        data = r.json()
-        if not data.get("success"):
-            raise RuntimeError(f"Login failed: {data}")
+        # 클라이언트는 여러 세션이 공유할 수 있으므로, 로그인은 별도 쿠키 저장소를 가진
+        # 임시 클라이언트로 수행하고 성공했을 때만 쿠키를 반영한다.
+        # (실패 응답의 Set-Cookie가 공유 세션 쿠키를 덮어쓰지 않도록)
+        with httpx.Client(
+            http2=True,
+            timeout=30,
+            follow_redirects=True,
+            headers=self.sess.headers,
+        ) as tmp:
+            r = tmp.post(url, json=payload, timeout=30)
+            r.raise_for_status()
+            data = orjson.loads(r.content)
+            if not data.get("success"):
+                raise RuntimeError(f"Login failed: {data}")
+            self.sess.cookies.update(tmp.cookies)
         return data
 
     # ---------- QCM ----------
@@ -76,7 +114,7 @@ class QF3Client:
         }
         r = self.sess.post(url, json=payload, timeout=30)
         r.raise_for_status()
-        return r.json()
+        return orjson.loads(r.content)
 
     def line_list(
         self,
@@ -84,7 +122,23 @@ class QF3Client:
         page: int = 1,
         limit: int = 200,
         node: str = "root",
+        store_cache: bool = True,
     ) -> Dict[str, Any]:
+        # 같은 mfgInspectionId 재조회(행 선택 후 엑셀 등)는 LINE_CACHE_TTL 동안 캐시에서 반환.
+        # 응답 원문(bytes)을 저장하고 매번 파싱하므로 호출자는 항상 새 객체를 받는다.
+        # store_cache=False: 캐시 조회만 하고 새 응답은 저장하지 않음 (대량 일괄 조회용)
+        key = (int(mfg_inspection_id), int(page), int(limit), node)
+        now = time.monotonic()
+        with self._line_cache_lock:
+            hit = self._line_cache.get(key)
+            if hit is not None and now - hit[0] >= LINE_CACHE_TTL:
+                del self._line_cache[key]
+                hit = None
+            if hit is not None:
+                self._line_cache.move_to_end(key)
+        if hit is not None:
+            return orjson.loads(hit[1])
+
         url = f"{self.config.base_url}/qcm/operation_inspection-view/line-list"
         payload = {
             "languageCode": self.config.language_code,
@@ -98,7 +152,16 @@ class QF3Client:
         }
         r = self.sess.post(url, json=payload, timeout=30)
         r.raise_for_status()
-        return r.json()
+        data = orjson.loads(r.content)
+        if not store_cache:
+            return data
+
+        with self._line_cache_lock:
+            self._line_cache[key] = (now, r.content)
+            self._line_cache.move_to_end(key)
+            while len(self._line_cache) > LINE_CACHE_SIZE:
+                self._line_cache.popitem(last=False)
+        return data
 
     # ---------- MFG ----------
     def joborder_list(
@@ -142,19 +205,76 @@ class QF3Client:
         }
         r = self.sess.post(url, json=payload, timeout=30)
         r.raise_for_status()
-        return r.json()
+        return orjson.loads(r.content)
 
     # ---------- Helpers ----------
     @staticmethod
     def _extract_list(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
-        return (resp or {}).get("data", {}).get("list", []) or []
+        if not resp:
+            return []
+        data = resp.get("data")
+        if not data:
+            return []
+        lst = data.get("list")
+        return lst if lst else []
 
     @staticmethod
     def _extract_total(resp: Dict[str, Any]) -> int:
-        lst = (resp or {}).get("data", {}).get("list", []) or []
-        if not lst:
+        try:
+            lst = resp["data"]["list"]
+            first = lst[0]
+        except (KeyError, IndexError, TypeError):
             return 0
-        return int(lst[0].get("cnt", len(lst)) or len(lst))
+        v = first.get("cnt")
+        # cnt가 없으면 현재 페이지 건수를 total로 본다 (기존 동작 유지)
+        return int(v) if v else len(lst)
+
+    def _fetch_pages(
+        self,
+        fetch_page: Callable[[int], Dict[str, Any]],
+        limit: int,
+        max_pages: int,
+        concurrency: int,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        1페이지를 먼저 받아 total(cnt)을 확인한 뒤,
+        나머지 페이지(2..last_page)는 스레드풀로 동시에 요청한다.
+        반환값은 페이지 순서대로 정렬된 rows 목록.
+        """
+        first = fetch_page(1)
+        rows = self._extract_list(first)
+        if not rows:
+            return []
+
+        pages: List[List[Dict[str, Any]]] = [rows]
+        total = self._extract_total(first)
+        last_page = min(max_pages, -(-total // limit))
+        if last_page <= 1:
+            return pages
+
+        workers = max(1, min(concurrency, MAX_CONCURRENCY, last_page - 1))
+        if workers == 1:
+            # 순차 조회 (빈 페이지에서 중단)
+            for page in range(2, last_page + 1):
+                rows = self._extract_list(fetch_page(page))
+                if not rows:
+                    break
+                pages.append(rows)
+            return pages
+
+        by_page: Dict[int, List[Dict[str, Any]]] = {}
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(fetch_page, p): p for p in range(2, last_page + 1)}
+            try:
+                for fut in as_completed(futures):
+                    by_page[futures[fut]] = self._extract_list(fut.result())
+            except BaseException:
+                # 한 페이지라도 실패하면 남은 요청은 보내지 않고 바로 에러를 올린다
+                ex.shutdown(wait=False, cancel_futures=True)
+                raise
+        for page in sorted(by_page):
+            pages.append(by_page[page])
+        return pages
 
     def build_job_equipment_map(
         self,
@@ -162,21 +282,19 @@ class QF3Client:
         released_date_to: str,
         limit: int = 500,
         max_pages: int = 999,
+        concurrency: int = MAX_CONCURRENCY,
     ) -> Dict[str, Dict[str, Any]]:
-        mp: Dict[str, Dict[str, Any]] = {}
-        page = 1
-        while page <= max_pages:
-            resp = self.joborder_list(
+        def _page(page: int) -> Dict[str, Any]:
+            return self.joborder_list(
                 released_date_from=released_date_from,
                 released_date_to=released_date_to,
                 page=page,
                 limit=limit,
                 start=1,
             )
-            rows = self._extract_list(resp)
-            if not rows:
-                break
 
+        mp: Dict[str, Dict[str, Any]] = {}
+        for rows in self._fetch_pages(_page, limit, max_pages, concurrency):
             for r in rows:
                 jn = r.get("jobName")
                 if not jn:
@@ -186,11 +304,6 @@ class QF3Client:
                     "machineName": r.get("machineName"),
                     "resourceName": r.get("resourceName"),
                 }
-
-            total = self._extract_total(resp)
-            if len(mp) >= total:
-                break
-            page += 1
         return mp
 
     def fetch_all_heads(
@@ -205,11 +318,10 @@ class QF3Client:
         check_class: str = "OPR",
         limit: int = 500,
         max_pages: int = 999,
+        concurrency: int = MAX_CONCURRENCY,
     ) -> List[Dict[str, Any]]:
-        all_rows: List[Dict[str, Any]] = []
-        page = 1
-        while page <= max_pages:
-            resp = self.head_list(
+        def _page(page: int) -> Dict[str, Any]:
+            return self.head_list(
                 inspection_date_from=inspection_date_from,
                 inspection_date_to=inspection_date_to,
                 item_code=item_code,
@@ -222,15 +334,10 @@ class QF3Client:
                 limit=limit,
                 start=1,
             )
-            rows = self._extract_list(resp)
-            if not rows:
-                break
-            all_rows.extend(rows)
 
-            total = self._extract_total(resp)
-            if len(all_rows) >= total:
-                break
-            page += 1
+        all_rows: List[Dict[str, Any]] = []
+        for rows in self._fetch_pages(_page, limit, max_pages, concurrency):
+            all_rows.extend(rows)
         return all_rows
 
     @staticmethod
@@ -238,20 +345,15 @@ class QF3Client:
         heads: List[Dict[str, Any]],
         job_mp: Dict[str, Dict[str, Any]],
     ) -> List[Dict[str, Any]]:
-        out: List[Dict[str, Any]] = []
+        # heads는 조회 직후의 새 객체(st.cache_data도 복사본을 반환)이므로
+        # 행마다 dict를 복사하지 않고 그대로 채워서 돌려준다.
         for h in heads:
-            h2 = dict(h)
-            jn = h2.get("jobName")
-            eq = job_mp.get(jn, {}) if jn else {}
-
-            h2["workcenterName"] = eq.get("workcenterName")
-            h2["machineName"] = eq.get("machineName")
-            h2["resourceName"] = eq.get("resourceName")
-
-            wc = h2.get("workcenterName") or ""
-            mc = h2.get("machineName") or ""
-            rs = h2.get("resourceName") or ""
-            h2["equipmentDisplay"] = " / ".join([x for x in [wc, mc, rs] if x])
-
-            out.append(h2)
-        return out
+            eq = job_mp.get(h.get("jobName")) or {}
+            h["workcenterName"] = eq.get("workcenterName")
+            h["machineName"] = eq.get("machineName")
+            h["resourceName"] = eq.get("resourceName")
+            wc = h["workcenterName"] or ""
+            mc = h["machineName"] or ""
+            rs = h["resourceName"] or ""
+            h["equipmentDisplay"] = " / ".join(p for p in (wc, mc, rs) if p)
+        return heads
@@ -1,12 +1,18 @@
 import os
 import pickle
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
+import orjson
 import requests
 
 
-@dataclass
+# 페이지 병렬 요청 상한 (requests.Session을 스레드 간 공유하므로 서버/풀 부담 제한)
+MAX_CONCURRENCY = 8
+
+
+@dataclass(slots=True)
 class DebugTrace:
     method: str = ""
     url: str = ""
@@ -14,16 +20,22 @@ class DebugTrace:
     request_payload: Any = None
     status_code: int = 0
     response_headers: Dict[str, Any] = None
-    response_text_head: str = ""
+    response_head: bytes = b""
+
+    @property
+    def response_text_head(self) -> str:
+        # 필요할 때만 디코드
+        return self.response_head.decode("utf-8", errors="replace")
 
 
 class QFactoryClient:
     ITEM_LIST_ENDPOINT = "/base/item/list"
 
-    def __init__(self, base_url: str, cookie_path: str = "qf_cookies.pkl"):
+    def __init__(self, base_url: str, cookie_path: str = "qf_cookies.pkl", trace_enabled: bool = False):
         self.base_url = base_url.rstrip("/")
         self.sess = requests.Session()
         self.cookie_path = cookie_path
+        self.trace_enabled = trace_enabled
         self.last_trace: DebugTrace = DebugTrace(request_headers={}, response_headers={})
 
         origin = self.base_url.replace(":8000", "")
@@ -55,7 +67,8 @@ class QFactoryClient:
             os.remove(self.cookie_path)
 
     def _trace(self, method: str, url: str, headers: Dict[str, Any], payload: Any, resp: requests.Response):
-        text = resp.text if resp.text else ""
+        if not self.trace_enabled:
+            return
         self.last_trace = DebugTrace(
             method=method,
             url=url,
@@ -63,7 +76,7 @@ class QFactoryClient:
             request_payload=payload,
             status_code=resp.status_code,
             response_headers=dict(resp.headers),
-            response_text_head=text[:2000],
+            response_head=resp.content[:2000],
         )
 
     def post_json(self, path: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: int = 60) -> Dict[str, Any]:
@@ -75,7 +88,7 @@ class QFactoryClient:
         resp = self.sess.post(url, headers=h, json=payload, timeout=timeout)
         self._trace("POST", url, h, payload, resp)
         resp.raise_for_status()
-        return resp.json()
+        return orjson.loads(resp.content)
 
     def login(self, company_code: str, user_key: str, password: str, language_code: str = "KO") -> Dict[str, Any]:
         payload = {
@@ -129,6 +142,13 @@ class QFactoryClient:
         if not isinstance(resp_json, dict):
             return []
 
+        # 서버 응답은 보통 {"data": {"list": [...]}} 형태 -> 바로 꺼내고, 아니면 일반 탐색
+        data = resp_json.get("data")
+        if isinstance(data, dict):
+            lst = data.get("list")
+            if isinstance(lst, list):
+                return lst
+
         for path in [
             ("data", "list"),
             ("data", "rows"),
@@ -188,13 +208,10 @@ class QFactoryClient:
         limit: int = 500,
         max_pages: int = 9999,
         progress_cb=None,
+        concurrency: int = MAX_CONCURRENCY,
     ) -> List[Dict[str, Any]]:
-        all_rows: List[Dict[str, Any]] = []
-        page = 1
-        total = None
-
-        while page <= max_pages:
-            resp = self.list_items_page(
+        def _page(page: int) -> Dict[str, Any]:
+            return self.list_items_page(
                 language_code=language_code,
                 company_id=company_id,
                 status=status,
@@ -209,20 +226,52 @@ class QFactoryClient:
                 limit=limit,
             )
 
-            if total is None:
-                total = self.extract_total(resp)
+        resp = _page(1)
+        total = self.extract_total(resp)
+        rows = self.extract_rows(resp)
+        all_rows: List[Dict[str, Any]] = list(rows)
 
-            rows = self.extract_rows(resp)
-            all_rows.extend(rows)
+        if progress_cb:
+            progress_cb(page=1, got=len(rows), total=total, acc=len(all_rows))
 
-            if progress_cb:
-                progress_cb(page=page, got=len(rows), total=total, acc=len(all_rows))
+        if total is not None:
+            # total을 알면 필요한 페이지 수를 바로 계산해서 2..n 페이지를 한 번에 요청
+            # 1페이지가 limit보다 짧으면(서버가 페이지 크기를 제한하는 경우 포함) 거기서 종료
+            last_page = min(max_pages, -(-total // limit))
+            if last_page <= 1 or len(all_rows) >= total or len(rows) < limit:
+                return all_rows
 
-            if total is not None and len(all_rows) >= total:
-                break
-            if len(rows) < limit:
-                break
+            by_page: Dict[int, List[Dict[str, Any]]] = {}
+            workers = max(1, min(concurrency, MAX_CONCURRENCY, last_page - 1))
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                futures = {ex.submit(_page, p): p for p in range(2, last_page + 1)}
+                try:
+                    for fut in as_completed(futures):
+                        page = futures[fut]
+                        by_page[page] = self.extract_rows(fut.result())
+                        if progress_cb:
+                            acc = len(all_rows) + sum(len(v) for v in by_page.values())
+                            progress_cb(page=page, got=len(by_page[page]), total=total, acc=acc)
+                except BaseException:
+                    # 한 페이지라도 실패하면 남은 요청은 보내지 않고 바로 에러를 올린다
+                    ex.shutdown(wait=False, cancel_futures=True)
+                    raise
+            # 순차 조회와 같은 종료 조건: total 도달 또는 짧은 페이지 이후는 버림
+            for page in sorted(by_page):
+                rows = by_page[page]
+                all_rows.extend(rows)
+                if len(all_rows) >= total or len(rows) < limit:
+                    break
+            return all_rows
 
+        # total을 모르면 기존처럼 순차 조회
+        page = 1
+        while len(rows) >= limit and page < max_pages:
             page += 1
+            rows = self.extract_rows(_page(page))
+            all_rows.extend(rows)
+
+            if progress_cb:
+                progress_cb(page=page, got=len(rows), total=total, acc=len(all_rows))
 
         return all_rows